@@ -3,11 +3,12 @@ support/seano/views/shared/components.py
 
 Shared code that renders certain common view components.
 """
-import itertools
+from functools import lru_cache
 from .hlist import SeanoUnlocalizedHListIterNode
 from .links import get_ticket_display_name
 
 
+@lru_cache(maxsize=None)
 def seano_render_html_ticket(url):
     ticket = '<a href="%s" target="_blank">%s</a>' % (url, get_ticket_display_name(url))
     return '<span style="font-size:75%">' + ticket + '</span>'
@@ -23,6 +24,29 @@ def seano_html_hlist_line_formatter_simple(node):
 
 def seano_html_hlist_line_formatter_text_with_tickets(notes, line_formatter=None):  #pylint: disable=C0103
     line_formatter = line_formatter or seano_html_hlist_line_formatter_simple
+
+    # Index the notes by ID once, rather than scanning every note each time we look up tickets.
+    # Positions are remembered so that tickets are still gathered in the order of the notes.
+    note_tickets = []
+    note_positions = {}
+    for position, note in enumerate(notes):
+        note_tickets.append(note.get('tickets') or ())
+        note_positions.setdefault(note['id'], []).append(position)
+
+    def get_tickets(note_ids):
+        # Gather in a single flat pass, removing duplicates without changing sort order:
+        positions = set()
+        for x in note_ids:
+            positions.update(note_positions.get(x, ()))
+        seen = set()
+        result = []
+        for x in sorted(positions):
+            for ticket in note_tickets[x]:
+                if ticket not in seen:
+                    seen.add(ticket)
+                    result.append(ticket)
+        return result
+
     def formatter(node):
         result = line_formatter(node)
 
@@ -38,38 +62,31 @@ def seano_html_hlist_line_formatter_text_with_tickets(notes, line_formatter=None
         # None of our parents have printed.  Do all of our children have the
         # same tickets as us?
 
-        def get_tickets(note_ids):
-            return itertools.chain(*[note.get('tickets') or [] for note in notes if note['id'] in note_ids])
-        tickets = list(get_tickets(note_ids=node.element.tags))
+        tickets = get_tickets(note_ids=node.note_ids)
         tickets_set = set(tickets)
 
-        for child in node.walk():
-            if tickets_set != set(get_tickets(child.note_ids)):
-                # One of our children has a different note set than us.
-                # Defer printing of tickets until we get to a deeper sub-line.
-                return result
+        # (walk our existing iteration tree with an explicit stack, because ``node.walk()``
+        # would clone the entire subtree on every line we format; remember every line we
+        # visit, so that we can silence them below without walking the tree again)
+        visited = [node]
+        stack = list(node.children)
+        while stack:
+            child = stack.pop()
+            visited.append(child)
+            # Identical note IDs trivially imply identical tickets:
+            if child.note_ids is not node.note_ids and child.note_ids != node.note_ids:
+                if tickets_set != set(get_tickets(child.note_ids)):
+                    # One of our children has a different note set than us.
+                    # Defer printing of tickets until we get to a deeper sub-line.
+                    return result
+            stack.extend(child.children)
 
         # We've decided to print tickets on this line.  Silence tickets on all sub-lines:
-        def silence(x):
+        for x in visited:
             x.is_printed = True
-            for child in x.children:
-                silence(child)
-        silence(node)
-
-        # Remove duplicate tickets without changing sort order:
-        def dedup(lst):
-            seen = set()
-            for x in lst:
-                if x not in seen:
-                    seen.add(x)
-                    yield x
-        tickets = dedup(tickets)
-
-        # Compile tickets into HTML:
-        tickets = [seano_render_html_ticket(x) for x in tickets]
 
-        # Return entire note line, with all of the tickets:
-        return ' '.join([result] + tickets)
+        # Return entire note line, with all of the tickets compiled into HTML:
+        return ' '.join([result, *map(seano_render_html_ticket, tickets)])
 
     return formatter
 
@@ -79,24 +96,28 @@ def seano_render_html_hlist(hlist, is_blob_field=False, block_formatter=None, li
     block_formatter = block_formatter or seano_html_hlist_blob_formatter_simple
     line_formatter = line_formatter or seano_html_hlist_line_formatter_simple
 
-    def _run(node):
+    # Render with an explicit work stack, emitting into a single flat list that is joined once at
+    # the end.  Each stack entry is either a node to render, or a closing tag to emit once all of
+    # the children of its node have been rendered.
+    result = []
+    stack = [SeanoUnlocalizedHListIterNode(node=hlist, level=-1 if is_blob_field else 0)]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, str):
+            result.append(node)
+            continue
 
         if node.level > 0:
-            yield '<li>'
-            yield line_formatter(node=node)
+            result.append('<li>')
+            result.append(line_formatter(node=node))
+            stack.append('</li>')
         elif node.element:
-            yield block_formatter(node=node)
+            result.append(block_formatter(node=node))
 
         if node.children:
             if node.level >= 0:
-                yield '<ul>'
-            for child in node.children:
-                for hunk in _run(node=child):
-                    yield hunk
-            if node.level >= 0:
-                yield '</ul>'
-
-        if node.level > 0:
-            yield '</li>'
+                result.append('<ul>')
+                stack.append('</ul>')
+            stack.extend(reversed(node.children))
 
-    return ''.join(_run(node=SeanoUnlocalizedHListIterNode(node=hlist, level=-1 if is_blob_field else 0)))
+    return ''.join(result)
@@ -3,8 +3,7 @@ support/seano/views/shared/hlist.py
 
 Infrastructure to work with hierarchical lists (hlists)
 """
-from functools import reduce
-
+import sys
 from .markup import (
     SUPPORTED_MARKUP,
     SeanoMarkup,
@@ -122,14 +121,33 @@ class SeanoUnlocalizedHListNode(object):
         return result
 
     def merge(self, other):
-        for incoming in other.children:
-            for check in self.children:
-                if check.element.payload == incoming.element.payload:
-                    check.element.tags = sorted(set(check.element.tags).union(incoming.element.tags))
-                    check.merge(incoming)
-                    break
-            else:
-                self.children.append(incoming.deep_copy())
+        # Merge iteratively (rather than recursively) using a stack of pending
+        # (destination, incoming) node pairs.  Matched pairs are pushed in
+        # reverse order so that they are processed depth-first, in the same
+        # order that a recursive merge would process them.
+        stack = [(self, other)]
+        while stack:
+            dst, src = stack.pop()
+
+            # Index our children by payload, so that finding the matching child
+            # is a hash lookup rather than a scan over all of our children:
+            index = {}
+            for check in dst.children:
+                index.setdefault(check.element.payload, check)
+
+            matched = []
+            for incoming in src.children:
+                check = index.get(incoming.element.payload)
+                if check is not None:
+                    tags = set(check.element.tags)
+                    tags.update(incoming.element.tags)
+                    check.element.tags = sorted(tags)
+                    matched.append((check, incoming))
+                else:
+                    check = incoming.deep_copy()
+                    dst.children.append(check)
+                    index[check.element.payload] = check
+            stack.extend(reversed(matched))
         return self
 
 
@@ -180,6 +198,8 @@ def _parse_hlist_node(data, localization, note_id, markup_constructor):
     if isinstance(data, dict):
         # hlist (convert key/value to element/children)
         for k, v in data.items():
+            if isinstance(k, str):
+                k = sys.intern(k)
             yield SeanoUnlocalizedHListNode(
                 element=markup_constructor(payload=k, localization=localization, tags=[note_id] if note_id else []),
                 children=list(_parse_hlist_node(data=v, localization=localization, note_id=note_id, markup_constructor=markup_constructor))
@@ -189,6 +209,10 @@ def _parse_hlist_node(data, localization, note_id, markup_constructor):
     # all other values are assumed to be markup text, though sometimes Yaml
     # can decide to use other types...  pass the raw value to the markup
     # constructor and hope it works.
+    if isinstance(data, str):
+        # The same text often appears in many notes; interning it dedups the
+        # storage, and lets equality checks during merging short-circuit:
+        data = sys.intern(data)
     yield SeanoUnlocalizedHListNode(
         element=markup_constructor(payload=data, localization=localization, tags=[note_id] if note_id else []),
         children=None,
@@ -304,9 +328,13 @@ def seano_read_hlist(notes, keys, localizations):
                         pick_locs = localizations,
                     ):
                         if hunk.element:
-                            yield SeanoUnlocalizedHListNode(element=None, children=[hunk])
-                        else:
                             yield hunk
+                        else:
+                            for child in hunk.children:
+                                yield child
                     break
 
-    return reduce(lambda a, b: a.merge(b), _inner(), SeanoUnlocalizedHListNode(element=None, children=None))
+    # Merge all of the hunks in a single pass, so that the index of top-level
+    # nodes is built once, rather than once per hunk:
+    result = SeanoUnlocalizedHListNode(element=None, children=None)
+    return result.merge(SeanoUnlocalizedHListNode(element=None, children=list(_inner())))
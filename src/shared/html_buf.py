@@ -3,19 +3,9 @@ support/seano/views/shared/html_buf.py
 
 Infrastructure to help build HTML files
 """
+from html import escape as html_escape #pylint: disable=W0611
 from .text_buf import FencedTextBuffer
 
-try:
-    from html import escape as _html_escape_func # correct on python 3; explodes on python 2
-except ImportError:
-    # Must be python 2
-    from cgi import escape as _html_escape_func
-
-def html_escape(txt):
-    # ABK: So, pylint doesn't follow the try/except logic above, which results in it issuing W1505 saying that
-    #      `cgi.escape` is deprecated **ON PYTHON 3**.  In my experimentation, this is the easiest workaround.
-    return _html_escape_func(txt) #pylint: disable=W1505
-
 
 class SeanoHtmlFragment(object):
     '''
@@ -38,11 +28,11 @@ class SeanoHtmlBuffer(object):
     '''
     Helps you write a single-file HTML file, in a world where:
 
-    - it's a fairly non-trivial document, so you want to use a file buffer for performance
+    - it's a fairly non-trivial document, so you want to append to in-memory buffers for performance
     - you don't know all of the CSS and JS prior to writing the body
-    - you want to support Unicode & Python 2 & Python 3 (file streams are a pain)
+    - you want to support Unicode (file streams are a pain)
 
-    You should use this class within a ``with`` statement so that proper cleanup happens if an exception is raised.
+    This class may be used within a ``with`` statement, but there is nothing to clean up.
 
     This class accepts both ASCII strings UTF-8 strings.
 
@@ -69,26 +59,15 @@ class SeanoHtmlBuffer(object):
 
     def __enter__(self):
         '''
-        For compatibility with ``with``.  We have nothing special to do ourselves, but we should forward this notice to
-        each of the file buffers.
+        For compatibility with ``with``.  We have nothing special to do.
         '''
-        self.doc.__enter__()
-        self.head.__enter__()
-        self.css.__enter__()
-        self.js.__enter__()
-        self.body.__enter__()
         return self
 
     def __exit__(self, ertype, value, traceback):
         '''
-        For compatibility with ``with``.  We have nothing special to do ourselves, but we should forward this notice to
-        each of the file buffers.
+        For compatibility with ``with``.  We have nothing special to do.
         '''
-        self.doc.__exit__(ertype, value, traceback)
-        self.head.__exit__(ertype, value, traceback)
-        self.css.__exit__(ertype, value, traceback)
-        self.js.__exit__(ertype, value, traceback)
-        self.body.__exit__(ertype, value, traceback)
+        pass
 
     def write_head(self, txt):
         '''
@@ -118,11 +97,10 @@ class SeanoHtmlBuffer(object):
         '''
         Returns the finalized, concatenated string version of all data currently saved in this object.
 
-        The returned data is ALWAYS a unicode string, regardless of Python version.  This means it's a unicode object
-        in Python 2, and a str object in Python 3.
+        The returned data is ALWAYS a unicode string.  All sections are assembled as UTF-8 bytes, and decoded once.
         '''
-        return self.doc.udump(
-            insert_after_body=self.head.udump(
-                insert_after_body=self.css.udump() + self.js.udump()
-            ) + self.body.udump()
-        )
+        return self.doc.dump(
+            insert_after_body=self.head.dump(
+                insert_after_body=self.css.dump() + self.js.dump()
+            ) + self.body.dump()
+        ).decode('utf-8')
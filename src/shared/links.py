@@ -3,24 +3,40 @@ support/seano/views/shared/links.py
 
 Infrastructure to help process links to external servers
 """
+from functools import lru_cache
 import re
 
-github_issue_url_regex = re.compile(r'^https?://github.com/[^/]+/([^/]+)/issues/([0-9]+)$')
-jira_url_regex = re.compile(r'^https?://[^/]*jira[^/]*/browse/([A-Z]+\-[0-9]+)$')
-redmine_url_regex = re.compile(r'^https?://[^/]*redmine[^/]*/issues/([0-9]+)$')
+# Patterns for the ticket URLs of each ticket host we know about.  Each pattern is defined exactly once, here;
+# the regexes below are all built from these fragments:
+_github_issue_url_pattern = r'github.com/[^/]+/(?P<github_repo>[^/]+)/issues/(?P<github_id>[0-9]+)'
+_jira_url_pattern = r'[^/]*jira[^/]*/browse/(?P<jira_id>[A-Z]+\-[0-9]+)'
+_redmine_url_pattern = r'[^/]*redmine[^/]*/issues/(?P<redmine_id>[0-9]+)'
 
+# All of the above, combined into a single alternation (in priority order), so that identifying
+# a ticket costs one trip into the regex engine rather than one per ticket host:
+ticket_url_regex = re.compile(r'^https?://(?:%s)$' % ('|'.join([
+    _github_issue_url_pattern,
+    _jira_url_pattern,
+    _redmine_url_pattern,
+]),))
 
+# Deprecated: per-host regexes, kept for existing callers; prefer ``ticket_url_regex``.
+# (named groups are also numbered, so ``group(1)``, etc, still work on these)
+github_issue_url_regex = re.compile(r'^https?://%s$' % (_github_issue_url_pattern,))
+jira_url_regex = re.compile(r'^https?://%s$' % (_jira_url_pattern,))
+redmine_url_regex = re.compile(r'^https?://%s$' % (_redmine_url_pattern,))
+
+
+@lru_cache(maxsize=None)
 def get_ticket_display_name(url):
     '''
     Returns the display name of the ticket addressable at the given URL.
-    '''
-    m = github_issue_url_regex.match(url)
-    if m: return '/'.join([m.group(1), m.group(2)])
 
-    m = jira_url_regex.match(url)
-    if m: return m.group(1)
-
-    m = redmine_url_regex.match(url)
-    if m: return m.group(1)
+    Results are cached; the same tickets tend to be referenced by many notes.
+    '''
+    m = ticket_url_regex.match(url)
+    if m:
+        if m.group('github_id'): return '/'.join([m.group('github_repo'), m.group('github_id')])
+        return m.group('jira_id') or m.group('redmine_id')
 
     raise Exception("Don't know how to parse the given ticket URL: %s" % (url,))
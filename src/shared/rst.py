@@ -0,0 +1,406 @@
+"""
+support/seano/views/shared/rst.py
+
+Infrastructure to help compile reStructuredText markup (via DocUtils)
+
+This module is imported lazily by ``markup.py`` the first time any
+reStructuredText is compiled, because importing DocUtils is not cheap.
+
+*********************************************
+Institutional Knowledge on how DocUtils works
+*********************************************
+
+DocUtils has a "Node tree" concept that is responsible for laying out the
+structured form of a document.  Confusingly, there are *two* different node
+trees: (a) a class hierarchy of different kinds of Nodes, and (b) a document
+hierarchy of specific Node subclass objects that contain the data of the
+document.
+
+Certain Node classes are subclasses of other Node classes, which helps share
+code that serializes content to a certain filetype.
+
+The document tree is a tree of Node objects; each Node object then contains
+a fragment of the document, as it existed in the original reStructuredText
+document.
+
+In a sense, Nodes are the "common unifying document type" used internally
+by DocUtils to represent a document, prior to serializing to the requested
+target document type.
+
+Nodes are *not* responsible for serializing into a specific filetype.  The
+"Translator" concept is used to convert the tree of node objects into a
+serialized document.  A translator takes a single Node object (which presumably
+is the root of a Node tree), and serializes it into the document type it owns
+based on the class type of the Node object.  There is usually only one
+translator per serialized document type (RTF, PDF, man page, etc).
+
+If you want to support new output file types, what you want to define is a new
+Translator subclass.
+
+If you want to support a new directive in reStructuredText, you *may* want to
+create a new Node subclass, in particular if what the new directive receives
+from the user is conceptually a new kind of data.  For data types already
+supported, there's no reason you can't use an existing Node subclass.  Either
+way, you want to then create a Directive subclass and register it.  This
+registration process appears to be global, and may cause compatibility issues
+as complexity grows.  Iterate as needed.
+"""
+import collections
+import copy
+import json
+import re
+import threading
+# ABK: Why can't pylint import these modules?
+import docutils.core #pylint: disable=E0401
+import docutils.frontend #pylint: disable=E0401
+import docutils.io #pylint: disable=E0401
+import docutils.nodes #pylint: disable=E0401
+import docutils.parsers.rst #pylint: disable=E0401
+import docutils.readers.standalone #pylint: disable=E0401
+import docutils.writers.html4css1 #pylint: disable=E0401
+from .html_buf import SeanoHtmlFragment
+from .markup import SeanoMarkupException
+
+
+class SeanoMermaidNode(docutils.nodes.General, docutils.nodes.Element):
+    '''
+    This is a DocUtils Node subclass that represents the data received from
+    the user in a reStructuredText document when they use the ``.. mermaid::``
+    directive.
+
+    Nodes only declare data fragment types and store original document data;
+    they do not declare the directive itself or serialize any data to any
+    specific file format.
+
+    Per DocUtils conventions, this class should be named "mermaid" (lowercase).
+    However, that makes me (ABK) nervous, so I'm being more verbose for now.
+    '''
+    pass
+
+
+class SeanoMermaidDirective(docutils.parsers.rst.Directive):
+    '''
+    This is a DocUtils Directive subclass that parses a Mermaid directive
+    invocation from reStructuredText and converts it into a Node object
+    (specifically the Node subclass named ``SeanoMermaidNode``).
+
+    Per DocUtils conventions, this class should be named "Mermaid" (titlecase).
+    However, that makes me (ABK) nervous, so I'm being more verbose for now.
+    '''
+    has_content = True # Mermaid source passed via what reStructuredText calls the "content"
+    required_arguments = 0
+    optional_arguments = 0
+    final_argument_whitespace = False
+    option_spec = { # Dictionary of options accepted by this directive
+        'alt': docutils.parsers.rst.directives.unchanged,
+        'min-width': docutils.parsers.rst.directives.unchanged,
+        'max-width': docutils.parsers.rst.directives.unchanged,
+    }
+
+    def run(self):
+        node = SeanoMermaidNode()
+        node['code'] = '\n'.join(self.content)
+        node['options'] = {}
+        if 'alt' in self.options:
+            node['alt'] = self.options['alt']
+        if 'min-width' in self.options:
+            node['min-width'] = self.options['min-width']
+        if 'max-width' in self.options:
+            node['max-width'] = self.options['max-width']
+        return [node]
+
+# Actually register our Mermaid directive.  This is the line that makes the
+# syntax ``.. mermaid::`` work in a reStructuredText document.
+docutils.parsers.rst.directives.register_directive('mermaid', SeanoMermaidDirective)
+
+
+_MERMAID_AUTO_INIT_KEY = 0
+
+# The static parts of the script that compiles each Mermaid diagram, pre-joined once, so that serializing a diagram
+# only needs to splice in its unique identifier:
+_mermaid_script_head = ''.join([
+    '''</pre>''',
+    '''<script type="module">''',
+        '''import mermaid from 'https://cdn.jsdelivr.net/npm/mermaid@10/dist/mermaid.esm.min.mjs';''',
+        '''const prefersDarkMode = window.matchMedia('(prefers-color-scheme: dark)').matches;''',
+        '''mermaid.initialize({'startOnLoad': false, 'securityLevel': 'antiscript', 'theme': prefersDarkMode ? 'dark' : 'neutral'});''',
+        '''new IntersectionObserver((entries, observer) => {''',
+            '''entries.forEach(entry => {''',
+                '''if (entry.intersectionRatio > 0) {''',
+                    '''observer.disconnect();''',
+                    '''mermaid.run(''',
+])
+_mermaid_script_middle = ''.join([
+                    ''');''',
+                '''}''',
+            '''});''',
+        "}).observe(document.getElementById('",
+])
+_mermaid_script_tail = ''.join([
+        "'));",
+    '''</script>''',
+])
+
+class SeanoSingleFileHtmlTranslator(docutils.writers.html4css1.HTMLTranslator):
+    '''
+    This is a DocUtils Translator subclass that serializes a Node tree into
+    what we colloquially call "single-file HTML".  It is built upon DocUtils'
+    built-in HTML 4 & CSS 1 translator implementation.
+
+    When using this translator, you should use the ``docutils.writers.html4css1.Writer``
+    writer.
+    '''
+
+    # Set when the serialized output contains identifiers that must be unique
+    # within the final document (and therefore must not be re-used from a cache)
+    has_unique_ids = False
+
+    def visit_SeanoMermaidNode(self, node):
+        # ABK: Mermaid doesn't properly calculate the size of elements that are
+        # not visible.  To workaround, don't compile Mermaid diagrams until they
+        # are visible.  To implement this without requiring infrastructure
+        # outside of this method, we're going to give every Mermaid diagram its
+        # own unique identifier, and then use the `IntersectionObserver` API to
+        # detect when the element becomes visible, and when that happens, tell
+        # Mermaid to compile that specific diagram.
+        global _MERMAID_AUTO_INIT_KEY
+        _MERMAID_AUTO_INIT_KEY = _MERMAID_AUTO_INIT_KEY + 1
+        key = 'mermaid-%d' % (_MERMAID_AUTO_INIT_KEY,)
+        self.has_unique_ids = True
+
+        self.body.extend([
+            '<pre class="mermaid" id="', key, '">',
+            node['code'],
+            _mermaid_script_head,
+            json.dumps({'querySelector': '#' + key}),
+            _mermaid_script_middle,
+            key,
+            _mermaid_script_tail,
+        ])
+
+    def depart_SeanoMermaidNode(self, node):
+        pass
+
+
+_dl_elem_pattern = re.compile(r'''\s*</?d[ldt](?: [^>]*)?>\s*''', re.ASCII)
+_css_prefix = '<style type="text/css">\n\n'
+_css_suffix = '\n\n</style>\n'
+_dark_mode_css = '''
+
+@media (prefers-color-scheme: dark) {
+    /* Custom overrides for Pygments so that it doesn't suck in dark mode */
+    pre.code .ln { color: lightgrey; } /* line numbers */
+    pre.code .comment, code .comment { color: rgb(127, 139, 151) }
+    pre.code .keyword, code .keyword { color: rgb(236, 236, 22) }
+    pre.code .literal.string, code .literal.string { color: rgb(217, 200, 124) }
+    pre.code .name.builtin, code .name.builtin { color: rgb(255, 60, 255) }
+}'''
+# Compiled results, least recently used first; bounded because this cache lives for the life of the process
+_rst_cache = collections.OrderedDict()
+_rst_cache_lock = threading.Lock()
+_RST_CACHE_MAX_SIZE = 4096
+def _seano_rst_to_some_html(txt, writer_class, translator_class):
+    '''
+    Compiles the given reStructuredText blob into an HTML snippet, sans the ``<html>`` and ``<body>`` elements.
+
+    Returns a SeanoHtmlFragment object containing the HTML fragment, and also recommended CSS/JS to make it work.
+
+    On soft errors, this function may return an empty ``SeanoHtmlFragment`` object.  This function never returns None.
+
+    Compiled results are cached by input text, because identical markup (such as "Fix typo") is common across notes.
+    The cache holds the most recently used ``_RST_CACHE_MAX_SIZE`` results.  A new ``SeanoHtmlFragment`` object is
+    returned on every call, so callers are free to mutate it.
+    '''
+    if not txt.strip(): return SeanoHtmlFragment(html='')
+    key = (txt, writer_class, translator_class)
+    try:
+        with _rst_cache_lock:
+            html, css = _rst_cache[key]
+            _rst_cache.move_to_end(key)
+    except KeyError:
+        html, css, is_cacheable = _seano_compile_rst_to_some_html(txt, writer_class, translator_class)
+        if is_cacheable:
+            with _rst_cache_lock:
+                _rst_cache[key] = (html, css)
+                if len(_rst_cache) > _RST_CACHE_MAX_SIZE:
+                    _rst_cache.popitem(last=False)
+    return SeanoHtmlFragment(html=html, css=css)
+
+
+class _LineAccumulator(object):
+    '''
+    A minimal file-like object that DocUtils can write warnings to.  Unlike ``StringIO``, nothing needs to be
+    copied out of it to learn that nothing was written (the common case).
+    '''
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        if data:
+            self.chunks.append(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def lines(self):
+        return ''.join(self.chunks).splitlines()
+
+
+_rst_settings = {}
+def _seano_rst_settings(writer_class):
+    '''
+    Returns the default DocUtils settings for compiling reStructuredText with the given writer class.
+
+    Resolving settings involves building an option parser and reading DocUtils' config files, which
+    DocUtils would otherwise do for every publish.  Callers must copy the returned object before changing it.
+    '''
+    try:
+        return _rst_settings[writer_class]
+    except KeyError:
+        settings = docutils.frontend.OptionParser(
+            components=(docutils.parsers.rst.Parser, docutils.readers.standalone.Reader, writer_class),
+            defaults={'traceback': True}, # Same default as publish_parts()
+            read_config_files=True,
+        ).get_default_values()
+        _rst_settings[writer_class] = settings
+        return settings
+
+
+_thread_local = threading.local()
+def _seano_rst_publisher(writer_class, translator_class):
+    '''
+    Returns a DocUtils publisher object that reads reStructuredText from a string, and writes it using a writer
+    of the given class, configured to use the given translator class.
+
+    ``publish_parts()`` builds a new publisher, reader, parser, and writer for every compile.  All of those are
+    reusable (every publish replaces the source, the document, the translator, and the parts), so instead, one
+    publisher is kept per writer/translator combination.  Callers must assign ``settings`` and call
+    ``set_source()`` and ``set_destination()`` before each ``publish()``.  Publishers hold on to the state of the
+    most recent publish, so they are not shared across threads.
+    '''
+    try:
+        publishers = _thread_local.publishers
+    except AttributeError:
+        publishers = _thread_local.publishers = {}
+    try:
+        return publishers[writer_class, translator_class]
+    except KeyError:
+        writer = writer_class()
+        writer.translator_class = translator_class
+        publisher = docutils.core.Publisher(
+            writer=writer,
+            source_class=docutils.io.StringInput,
+            destination_class=docutils.io.StringOutput,
+        )
+        publisher.set_components(reader_name='standalone', parser_name='restructuredtext', writer_name=None)
+        publishers[writer_class, translator_class] = publisher
+        return publisher
+
+
+# A conservative approximation of single-line reStructuredText that contains no markup at all: it starts with a
+# letter or number (no bullets, comments, block quotes, etc), its first word does not end like a list enumerator, and
+# it contains no characters that are either markup or that DocUtils escapes.  Such text compiles to itself, wrapped
+# in a paragraph.  False negatives are harmless (they take the slow path).
+_plain_text_pattern = re.compile(r"""(?![^ ]*[.)](?: |\Z))[A-Za-z0-9][A-Za-z0-9 .,;?!'()/%-]*(?<! )\Z""")
+# (deliberately not matched by ``_plain_text_pattern``, so that it is always compiled by DocUtils)
+_plain_text_probe = "(Plain) text 0123456789 abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ .,;?!'()/%-"
+_plain_text_templates = {}
+def _seano_plain_text_template(writer_class, translator_class):
+    '''
+    Returns a tuple of the HTML before and after a plain text paragraph, and the CSS, as compiled by DocUtils using
+    the given writer and translator classes; or None if the compiled plain text does not come back verbatim (for
+    example, if smart quotes were enabled in a DocUtils config file).
+    '''
+    key = (writer_class, translator_class)
+    try:
+        return _plain_text_templates[key]
+    except KeyError:
+        html, css, _ = _seano_compile_rst_to_some_html(_plain_text_probe, writer_class, translator_class)
+        template = None
+        if html.count(_plain_text_probe) == 1:
+            prefix, suffix = html.split(_plain_text_probe)
+            template = (prefix, suffix, css)
+        _plain_text_templates[key] = template
+        return template
+
+
+def _seano_compile_rst_to_some_html(txt, writer_class, translator_class):
+    '''
+    The uncached implementation of ``_seano_rst_to_some_html()``.
+
+    Returns a tuple of the HTML, the CSS, and whether or not the result may be cached.
+    '''
+    # Lots of markup is just a plain line of text.  Skip DocUtils entirely for those:
+    if _plain_text_pattern.match(txt):
+        template = _seano_plain_text_template(writer_class, translator_class)
+        if template:
+            prefix, suffix, css = template
+            return prefix + txt + suffix, css, True
+
+    # Docutils likes to print warnings & errors to stderr & the compiled output.  We don't particularly want that
+    # here...  What we'd like ideally is to capture any warnings and errors, and explicitly report them to the
+    # caller.  If this is being used within Waf, we'd ideally like to trigger a build failure (and never have
+    # surprise output in the rendered HTML).
+    #
+    # Fortunately, Docutils lets us do this.
+    #
+    # More info on settings overrides here:
+    #   https://sourceforge.net/p/docutils/mailman/message/30882883/
+    #   https://github.com/pypa/readme_renderer/blob/master/readme_renderer/rst.py
+    #
+    # Documentation on how to use custom translator objects:
+    #   https://gist.github.com/mastbaum/2655700
+    #
+    error_accumulator = _LineAccumulator()
+    publisher = _seano_rst_publisher(writer_class, translator_class)
+    publisher.settings = copy.copy(_seano_rst_settings(writer_class))
+    publisher.settings.warning_stream = error_accumulator
+    publisher.set_source(source=txt)
+    publisher.set_destination()
+    publisher.publish()
+    writer = publisher.writer
+    parts = writer.parts
+
+    # Artificially fail if any errors or warnings were reported
+    if error_accumulator.chunks:
+        errors = error_accumulator.lines()
+        # ABK: Some errors include the bad markup, and some don't.  Not sure what the pattern is yet.
+        #      For now, for all errors, append the original full markup, with line numbers.
+        errors.append('    ' + '\n    '.join('%4d    %s' % (i, line) for i, line in enumerate(txt.splitlines(), 1)))
+        raise SeanoMarkupException('\n'.join(errors))
+
+    # No errors; return the rendered HTML fragment
+    html = parts['fragment']
+    css = parts['stylesheet']
+
+    # Docutils likes to insert <dl>, <dd>, and <dt> elements.  Long term, it would be nice to know why (screen readers
+    # come to mind).  For now, those elements are causing problems with styling.  Yank them out.
+    # (most fragments don't contain any of these elements; don't make the regex engine walk those fragments)
+    if '<d' in html:
+        html = _dl_elem_pattern.sub('', html)
+
+    # The CSS that Docutils returns is wrapped inside a <style> element.  We don't want that here.  Yank it out.
+    if not css.startswith(_css_prefix):
+        raise SeanoMarkupException('CSS returned from the reStructuredText compiler has an unexpected prefix: %s', css)
+    css = css[len(_css_prefix):]
+
+    if not css.endswith(_css_suffix):
+        raise SeanoMarkupException('CSS returned from the reStructuredText compiler has an unexpected suffix: %s', css)
+    css = css[:len(css) - len(_css_suffix)]
+
+    # The default Pygments CSS does not work in dark mode; let's fix that:
+    css = css + _dark_mode_css
+
+    return html, css, not getattr(writer.visitor, 'has_unique_ids', False)
+
+
+def seano_rst_to_html(txt):
+    '''
+    Compiles the given reStructuredText blob into a single-file HTML snippet.  See ``_seano_rst_to_some_html()``.
+    '''
+    return _seano_rst_to_some_html(txt,
+                                   writer_class=docutils.writers.html4css1.Writer,
+                                   translator_class=SeanoSingleFileHtmlTranslator)
@@ -24,18 +24,31 @@ def seano_paint_backstory_releases(cmc, start):
     Releases descendant from the start release are not modified; this algorithm only operates
     on ancestors.
     """
-    def paint(name, is_backstory):
+    # A release reachable via multiple paths used to be re-painted once per path (exponential on
+    # merge-heavy ancestries), with the last path walked deciding the final value.  We get the same
+    # answer by walking the ancestors in the reverse order, and letting the *first* path that
+    # reaches each release win; that lets us visit each release only once, using an explicit stack.
+    visited = set()
+    stack = [(start, False)]
+    while stack:
+        name, is_backstory = stack.pop()
+        if name in visited:
+            continue
+        visited.add(name)
 
         cmc.named_releases[name]['is-backstory'] = is_backstory
 
-        ancestors = cmc.named_releases[name]['after']
-
-        for ancestor in [x['name'] for x in ancestors if x.get('is-backstory', False)]:
-            paint(ancestor, True)
-        for ancestor in [x['name'] for x in ancestors if not x.get('is-backstory', False)]:
-            paint(ancestor, is_backstory)
-
-    paint(start, False)
+        # Classify the ancestors in a single pass.  Backstory ancestors used to be walked first,
+        # so (walking in reverse) they are pushed first, to be popped last:
+        normal = []
+        backstory = []
+        for x in cmc.named_releases[name]['after']:
+            if x.get('is-backstory', False):
+                backstory.append((x['name'], True))
+            else:
+                normal.append((x['name'], is_backstory))
+        stack.extend(backstory)
+        stack.extend(normal)
 
 
 def seano_paint_release_sys_limits(cmc):
@@ -50,6 +63,16 @@ def seano_paint_release_sys_limits(cmc):
     seano_propagate_sticky_release_fields(cmc, fields)
 
 
+# Risk levels, ranked by priority.  Any risk level that is set but not recognized (including malformed values
+# that aren't strings) ranks as an empty string, and is outranked by every recognized level; if no note sets
+# a risk level at all, the result is None.
+_risk_levels_by_rank = (None, '', 'low', 'medium', 'high')
+_risk_ranks = {level: rank for rank, level in enumerate(_risk_levels_by_rank) if level}
+_RISK_RANK_NONE = 0
+_RISK_RANK_UNKNOWN = 1
+_RISK_RANK_HIGHEST = len(_risk_levels_by_rank) - 1
+
+
 def seano_paint_release_risk_levels(cmc):
     """
     Iterates over the releases list in the given ``SeanoMetaCache`` (``cmc``) object,
@@ -65,14 +88,18 @@ def seano_paint_release_risk_levels(cmc):
         if 'risk' in release:
             continue
 
-        # Because we're iterating over all releases (including backstories),
-        # we need to skip notes in each release that are copied from backstories:
-        notes = [n for n in release['notes'] if not n.get('is-copied-from-backstory')]
-
-        levels = [x.get('risk') for x in notes]
-        for level in ['high', 'medium', 'low']:
-            if level in levels:
-                release['risk'] = level
-                break
-        else:
-            release['risk'] = '' if any([x != None for x in levels]) else None
+        # Find the highest ranked risk level in a single pass, bailing early once we've seen the highest
+        # possible level.  Because we're iterating over all releases (including backstories), we need to
+        # skip notes in each release that are copied from backstories:
+        best = _RISK_RANK_NONE
+        for n in release['notes']:
+            if n.get('is-copied-from-backstory'):
+                continue
+            level = n.get('risk')
+            if level is not None:
+                # (malformed values may be unhashable, so only strings are looked up)
+                best = max(best, _risk_ranks.get(level, _RISK_RANK_UNKNOWN) if isinstance(level, str) else _RISK_RANK_UNKNOWN)
+                if best == _RISK_RANK_HIGHEST:
+                    break
+
+        release['risk'] = _risk_levels_by_rank[best]
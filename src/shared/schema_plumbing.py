@@ -14,6 +14,128 @@ class SeanoSchemaPaintingException(Exception):
     pass
 
 
+# Sentinel for dictionary lookups, so that "is this key set" and "what is its value" is one lookup
+# (``None`` can't be used for this, because ``None`` is a legitimate value)
+_MISSING = object()
+
+
+def _release_neighbor_names(cmc, edge_key):
+    '''
+    Returns a dictionary mapping the name of every release in the given ``SeanoMetaCache`` (``cmc``) object to a
+    list of the names of the releases it links to via ``edge_key`` (``'after'`` or ``'before'``).  Built in a
+    single pass, and cached on ``cmc``.
+    '''
+    try:
+        cache = cmc.release_neighbor_names
+    except AttributeError:
+        cache = {}
+        cmc.release_neighbor_names = cache
+    try:
+        return cache[edge_key]
+    except KeyError:
+        result = {r['name']: [x['name'] for x in r[edge_key]] for r in cmc.releases}
+        cache[edge_key] = result
+        return result
+
+
+def _release_topological_order(cmc):
+    '''
+    Returns a list of all of the releases in the given ``SeanoMetaCache`` (``cmc``) object, ordered such that every
+    release comes after all of its ancestors (Kahn's algorithm).  Cached on ``cmc``.
+
+    If the ancestry contains a cycle (which makes such an order impossible), a ``SeanoSchemaPaintingException`` is
+    raised, naming the releases involved.
+    '''
+    try:
+        return cmc.release_topological_order
+    except AttributeError:
+        pass
+
+    parent_names = _release_neighbor_names(cmc, 'after')
+    children = {name: [] for name in parent_names}
+    num_pending_parents = {}
+    for name, parents in parent_names.items():
+        num_pending_parents[name] = len(parents)
+        for parent in parents:
+            children[parent].append(name)
+
+    result = []
+    ready = [r['name'] for r in cmc.releases if not num_pending_parents[r['name']]]
+    ready.reverse() # Pop the releases in their original order
+    while ready:
+        name = ready.pop()
+        result.append(cmc.named_releases[name])
+        for child in children[name]:
+            num_pending_parents[child] -= 1
+            if not num_pending_parents[child]:
+                ready.append(child)
+
+    if len(result) < len(cmc.releases):
+        # The releases we couldn't order are in a cycle, or descend from one.  Peel off the descendants
+        # (the same algorithm, walking the other direction), so that we can name the culprits:
+        unordered = {name for name, count in num_pending_parents.items() if count}
+        num_pending_children = {name: sum(1 for x in children[name] if x in unordered) for name in unordered}
+        ready = [name for name, count in num_pending_children.items() if not count]
+        while ready:
+            name = ready.pop()
+            unordered.discard(name)
+            for parent in parent_names[name]:
+                if parent in unordered:
+                    num_pending_children[parent] -= 1
+                    if not num_pending_children[parent]:
+                        ready.append(parent)
+        raise SeanoSchemaPaintingException('Release ancestry contains a cycle involving these releases: %s' % (
+            ', '.join(r['name'] for r in cmc.releases if r['name'] in unordered),
+        ))
+
+    cmc.release_topological_order = result
+    return result
+
+
+def _release_names_including_self(name, cmc, cache_name, edge_key):
+    '''
+    Shared implementation of ``seano_release_ancestor_names_including_self()`` and
+    ``seano_release_descendant_names_including_self()``; walks the release graph along ``edge_key``
+    (``'after'`` or ``'before'``), caching results on ``cmc`` in the member named ``cache_name``.
+    '''
+    try:
+        cache = getattr(cmc, cache_name)
+    except AttributeError:
+        cache = {}
+        setattr(cmc, cache_name, cache)
+    try:
+        return cache[name]
+    except KeyError:
+        pass
+
+    # Walk the graph with an explicit stack (deep ancestries would otherwise exhaust Python's recursion limit),
+    # computing each release's set only after the sets of all of its neighbors are known:
+    neighbor_names = _release_neighbor_names(cmc, edge_key)
+    in_progress = set()
+    stack = [name]
+    while stack:
+        current = stack[-1]
+        if current in cache:
+            stack.pop()
+            continue
+        neighbors = neighbor_names[current]
+        missing = [x for x in neighbors if x not in cache]
+        if missing:
+            for x in missing:
+                if x in in_progress:
+                    raise SeanoSchemaPaintingException('Release ancestry contains a cycle: %s is reachable from itself' % (x,))
+            in_progress.add(current)
+            stack.extend(missing)
+            continue
+        result = {current}
+        for x in neighbors:
+            result.update(cache[x])
+        cache[current] = result
+        in_progress.discard(current)
+        stack.pop()
+    return cache[name]
+
+
 def seano_release_ancestor_names_including_self(name, cmc):
     """
     Returns an unordered set of the names of all releases that are ancestors of the given release
@@ -28,19 +150,7 @@ def seano_release_ancestor_names_including_self(name, cmc):
 
     Returns: a set of release names (a set of strings)
     """
-    try:
-        cache = cmc.ancestor_release_name_sets_including_self
-    except AttributeError:
-        cache = {}
-        cmc.ancestor_release_name_sets_including_self = cache
-    try:
-        return cache[name]
-    except KeyError:
-        result = set([name]).union(*[
-            seano_release_ancestor_names_including_self(x['name'], cmc) for x in cmc.named_releases[name]['after']
-        ])
-        cache[name] = result
-        return result
+    return _release_names_including_self(name, cmc, 'ancestor_release_name_sets_including_self', 'after')
 
 
 def seano_release_descendant_names_including_self(name, cmc):
@@ -57,19 +167,26 @@ def seano_release_descendant_names_including_self(name, cmc):
 
     Returns: a set of release names (a set of strings)
     """
-    try:
-        cache = cmc.descendant_release_name_sets_including_self
-    except AttributeError:
-        cache = {}
-        cmc.descendant_release_name_sets_including_self = cache
-    try:
-        return cache[name]
-    except KeyError:
-        result = set([name]).union(*[
-            seano_release_descendant_names_including_self(x['name'], cmc) for x in cmc.named_releases[name]['before']
-        ])
-        cache[name] = result
-        return result
+    return _release_names_including_self(name, cmc, 'descendant_release_name_sets_including_self', 'before')
+
+
+def _minimum_release_list(bag, cmc, closure):
+    '''
+    Shared implementation of ``seano_minimum_ancestor_list()`` and ``seano_minimum_descendant_list()``;
+    removes from ``bag`` every release that is in the ``closure`` of any other release in ``bag``.
+    '''
+    if not isinstance(bag, list):
+        bag = list(bag)
+
+    for item in bag:
+        if len(bag) < 2:
+            # It's no longer possible to remove any elements
+            break
+        # (test membership in each closure directly, rather than building the union of all of them)
+        if any(item in closure(x, cmc) for x in bag if x != item):
+            bag = [x for x in bag if x != item]
+
+    return bag
 
 
 def seano_minimum_ancestor_list(bag, cmc):
@@ -85,18 +202,7 @@ def seano_minimum_ancestor_list(bag, cmc):
 
     Returns: list of release names (list of strings)
     """
-    if not isinstance(bag, list):
-        bag = list(bag)
-
-    for item in bag:
-        if len(bag) < 2:
-            # It's no longer possible to remove any elements
-            break
-        smaller_bag = [x for x in bag if x != item]
-        if item in set().union(*[seano_release_descendant_names_including_self(x, cmc) for x in smaller_bag]):
-            bag = smaller_bag
-
-    return bag
+    return _minimum_release_list(bag, cmc, seano_release_descendant_names_including_self)
 
 
 def seano_minimum_descendant_list(bag, cmc):
@@ -112,18 +218,26 @@ def seano_minimum_descendant_list(bag, cmc):
 
     Returns: list of release names (list of strings)
     """
-    if not isinstance(bag, list):
-        bag = list(bag)
+    return _minimum_release_list(bag, cmc, seano_release_ancestor_names_including_self)
 
-    for item in bag:
-        if len(bag) < 2:
-            # It's no longer possible to remove any elements
-            break
-        smaller_bag = [x for x in bag if x != item]
-        if item in set().union(*[seano_release_ancestor_names_including_self(x, cmc) for x in smaller_bag]):
-            bag = smaller_bag
 
-    return bag
+def _is_unanimous(values):
+    '''
+    Returns whether or not all of the given values (a non-empty list) are equal to each other.
+    '''
+    # (``list.count()`` compares in C, and works for unhashable values, such as lists or dicts)
+    return values.count(values[0]) == len(values)
+
+
+def _merge_unanimous(values):
+    '''
+    Returns the value shared by all of the given values.
+
+    If the given list is empty, or its values are not all equal, a ``SeanoSchemaPaintingException`` is raised.
+    '''
+    if not values or not _is_unanimous(values):
+        raise SeanoSchemaPaintingException('Unable to merge values: %s' % (values,))
+    return values[0]
 
 
 def seano_field_mergetool_opaque(does_privileged_base_exist, privileged_base, additions):
@@ -148,11 +262,21 @@ def seano_field_mergetool_opaque(does_privileged_base_exist, privileged_base, ad
     if does_privileged_base_exist:
         return privileged_base
 
-    if not additions or not all([x == additions[0] for x in additions]):
-        raise SeanoSchemaPaintingException('Unable to merge values: %s' % (additions,))
+    return _merge_unanimous(additions)
 
-    return additions[0]
 
+_copy_note_fields_error_template = '''
+
+This happened because multiple notes within the {release} release
+tried to set a different new value for {field},
+and seano isn't smart enough to reconcile the differences and save a
+provably correct merged value on the {release} release.  To workaround
+this problem, you have two main choices:
+
+1. Create a new release in between the two notes that conflict, such that
+   each release edits {field} only once
+2. Open up seano-config.yaml, and on the {release} release, manually
+   set the correctly merged value of {field}'''
 
 def seano_copy_note_fields_to_releases(cmc, fields):
     """
@@ -179,47 +303,61 @@ def seano_copy_note_fields_to_releases(cmc, fields):
     """
     if isinstance(fields, list):
         fields = {x: seano_field_mergetool_opaque for x in fields}
+    field_items = tuple(fields.items())
 
     # For each release:
     for r in cmc.releases:
 
-        # For each field we're copying from notes to releases:
-        for f in fields.keys():
-
+        # For each note, grab the values for all of the fields we're copying, in a single pass.
+        # Fields already set on the release are skipped when using the opaque merge tool, because
+        # the value on the release always wins; there's no need to gather values from notes:
+        note_values = {f: [] for f, merger in field_items
+                       if not (merger is seano_field_mergetool_opaque and f in r)}
+        for n in r['notes']:
             # Because we're iterating over all releases (including backstories),
             # we need to skip notes in each release that are copied from backstories:
-            notes = [n for n in r['notes'] if not n.get('is-copied-from-backstory')]
+            if n.get('is-copied-from-backstory'):
+                continue
+            for f, bucket in note_values.items():
+                value = n.get(f, _MISSING)
+                if value is not _MISSING:
+                    bucket.append(value)
+
+        # For each field we're copying from notes to releases:
+        for f, merger in field_items:
 
-            # For each note, grab the value for the current field:
-            values = [n[f] for n in notes if f in n]
+            values = note_values.get(f)
             if values:
 
                 # Merge the new values into the release:
                 try:
-                    r[f] = fields[f](
-                        does_privileged_base_exist=f in r,
-                        privileged_base=r.get(f),
-                        additions=values,
-                    )
+                    if merger is seano_field_mergetool_opaque:
+                        # Inlined opaque merge (we already know that the field is not set here):
+                        r[f] = _merge_unanimous(values)
+                    else:
+                        r[f] = merger(
+                            does_privileged_base_exist=f in r,
+                            privileged_base=r.get(f),
+                            additions=values,
+                        )
                 except SeanoSchemaPaintingException as e:
                     # We are not going to swallow this exception; we will let it unwind the stack.
                     # However, we would like to improve the error message before it goes.
-                    msg = e.args[0] + '''
-
-This happened because multiple notes within the {release} release
-tried to set a different new value for {field},
-and seano isn't smart enough to reconcile the differences and save a
-provably correct merged value on the {release} release.  To workaround
-this problem, you have two main choices:
-
-1. Create a new release in between the two notes that conflict, such that
-   each release edits {field} only once
-2. Open up seano-config.yaml, and on the {release} release, manually
-   set the correctly merged value of {field}'''.format(release=r['name'], field=f)
+                    msg = e.args[0] + _copy_note_fields_error_template.format(release=r['name'], field=f)
                     e.args = (msg,) + e.args[1:]
                     raise
 
 
+_propagate_sticky_fields_error_template = '''
+
+This happened because multiple ancestors of the {release} release
+have changed the value of {field} to different values,
+and seano isn't smart enough to reconcile the differences and save a
+provably correct merged value on the {release} release.  The easiest
+way to workaround this problem is to open up seano-config.yaml, and
+on the {release} release, manually set the correctly merged value of
+{field}.'''
+
 def seano_propagate_sticky_release_fields(cmc, fields):
     """
     Iterates over the releases list inside the given ``SeanoMetaCache`` (``cmc``) object, copying
@@ -242,51 +380,36 @@ def seano_propagate_sticky_release_fields(cmc, fields):
     in a blue moon.  This algorithm **has no reasonable merge tool**, and when you change a value
     in more than one parallel ancestry, when the ancestries eventually merge, things explode.
     """
-    if isinstance(fields, list):
-        fields = {x: seano_field_mergetool_opaque for x in fields}
+    # (when given a dictionary, only its keys are used; propagated values are always merged using
+    # ``seano_field_mergetool_opaque``)
+    fields = tuple(fields)
 
-    _seen_releases = set()
-    def process_release(release):
-        if release['name'] in _seen_releases:
-            return
-        _seen_releases.add(release['name'])
+    parent_names = _release_neighbor_names(cmc, 'after')
 
-        # Process all parents first:
-        for r in release['after']:
-            process_release(cmc.named_releases[r['name']])
+    # Process all parents before their children:
+    for release in _release_topological_order(cmc):
+        # List all non-transitive immediate parents, as release objects:
+        # (this only depends on the release, so do it once, rather than once per field)
+        parents = seano_minimum_descendant_list(bag=parent_names[release['name']], cmc=cmc)
+        parents = [cmc.named_releases[r] for r in parents]
 
         # Copy each field from the parent release, one by one:
         for f in fields:
-            # List all non-transitive immediate parents:
-            values = seano_minimum_descendant_list(bag=[x['name'] for x in release['after']], cmc=cmc)
-            # Convert release names to release objects:
-            values = [cmc.named_releases[r] for r in values]
-            # Fetch the value of the current field from each of the release objects, if set:
-            values = [r[f] for r in values if f in r]
+            # A value already set on this release always wins:
+            if f in release:
+                continue
+            # Fetch the value of the current field from each of the parent releases, if set:
+            values = [v for v in (r.get(f, _MISSING) for r in parents) if v is not _MISSING]
             # If this field was set on any parent:
             if values:
                 # ... then copy the value to this release:
                 # (note that we may have to reconcile multiple values from multiple parent releases)
                 try:
-                    release[f] = seano_field_mergetool_opaque(
-                        does_privileged_base_exist=f in release,
-                        privileged_base=release.get(f),
-                        additions=values,
-                    )
+                    # Inlined opaque merge (we already know that the field is not set here):
+                    release[f] = _merge_unanimous(values)
                 except SeanoSchemaPaintingException as e:
                     # We are not going to swallow this exception; we will let it unwind the stack.
                     # However, we would like to improve the error message before it goes.
-                    msg = e.args[0] + '''
-
-This happened because multiple ancestors of the {release} release
-have changed the value of {field} to different values,
-and seano isn't smart enough to reconcile the differences and save a
-provably correct merged value on the {release} release.  The easiest
-way to workaround this problem is to open up seano-config.yaml, and
-on the {release} release, manually set the correctly merged value of
-{field}.'''.format(release=release['name'], field=f)
+                    msg = e.args[0] + _propagate_sticky_fields_error_template.format(release=release['name'], field=f)
                     e.args = (msg,) + e.args[1:]
                     raise
-
-    for r in reversed(cmc.releases): # Not required, but reduces unnecessary recursion
-        process_release(r)
@@ -1,13 +1,17 @@
+import copy
 import unittest
 import yaml
+try:
+    from yaml import CSafeLoader as _YamlLoader # libyaml bindings, when available
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
 
 from shared.hlist import *
 from shared.hlist import _parse_hlist_node
 from shared.markup import SeanoMarkdown, SeanoReStructuredText
 
 
-def SAMPLE_FILES():
-    return list(yaml.load_all('''
+_SAMPLE_FILES = tuple(yaml.load_all('''
 alfa-loc-md:
   en-US: foo
 alfa-loc-rst:
@@ -54,7 +58,12 @@ echo-loc-hlist-md:
 echo-loc-hlist-md:
   en-US:
   - linux: ubuntu
-''', Loader=yaml.FullLoader))
+''', Loader=_YamlLoader))
+
+
+def SAMPLE_FILES():
+    # (parsed once, above; each test gets its own copy, so that tests can't affect each other)
+    return copy.deepcopy(list(_SAMPLE_FILES))
 
 
 if 'unittest.util' in __import__('sys').modules:
@@ -65,6 +74,18 @@ if 'unittest.util' in __import__('sys').modules:
 class HlistParsingTests(unittest.TestCase):
     maxDiff = None # Always display full diffs, even with large structures
 
+    @classmethod
+    def setUpClass(cls):
+        # Markup fixtures used by many of the expected results below (markup compares by value):
+        def md(payload):
+            return SeanoMarkdown(payload, localization='en-US', tags=['some-id'])
+        cls.HELLO = md('hello')
+        cls.WORLD = md('world')
+        cls.AGAIN = md('again')
+        cls.GOODBYE = md('goodbye')
+        cls.MOON = md('moon')
+        cls.CAT = md('cat')
+
     def testInitHlistNode(self):
         # Goal: ensure none of these throw
         self.assertFalse(SeanoUnlocalizedHListNode(element=None, children=None))
@@ -75,42 +96,42 @@ class HlistParsingTests(unittest.TestCase):
 
     def testHListNodeParser(self):
         self.assertEqual(
-            [SeanoUnlocalizedHListNode(element=SeanoMarkdown('hello', localization='en-US', tags=['some-id']), children=None)],
+            [SeanoUnlocalizedHListNode(element=self.HELLO, children=None)],
             list(_parse_hlist_node('hello', 'en-US', 'some-id', SUPPORTED_MARKUP['md'])),
         )
 
         self.assertEqual(
-            [SeanoUnlocalizedHListNode(element=SeanoMarkdown('hello', localization='en-US', tags=['some-id']), children=[
-                SeanoUnlocalizedHListNode(element=SeanoMarkdown('world', localization='en-US', tags=['some-id']), children=None),
+            [SeanoUnlocalizedHListNode(element=self.HELLO, children=[
+                SeanoUnlocalizedHListNode(element=self.WORLD, children=None),
             ])],
             list(_parse_hlist_node({'hello': 'world'}, 'en-US', 'some-id', SUPPORTED_MARKUP['md'])),
         )
 
         self.assertEqual(
-            [SeanoUnlocalizedHListNode(element=SeanoMarkdown('hello', localization='en-US', tags=['some-id']), children=[
-                SeanoUnlocalizedHListNode(element=SeanoMarkdown('world', localization='en-US', tags=['some-id']), children=[
-                    SeanoUnlocalizedHListNode(element=SeanoMarkdown('again', localization='en-US', tags=['some-id']), children=None),
+            [SeanoUnlocalizedHListNode(element=self.HELLO, children=[
+                SeanoUnlocalizedHListNode(element=self.WORLD, children=[
+                    SeanoUnlocalizedHListNode(element=self.AGAIN, children=None),
                 ]),
             ])],
             list(_parse_hlist_node({'hello': {'world': 'again'}}, 'en-US', 'some-id', SUPPORTED_MARKUP['md'])),
         )
 
         self.assertEqual(
-            [SeanoUnlocalizedHListNode(element=SeanoMarkdown('hello', localization='en-US', tags=['some-id']), children=None)],
+            [SeanoUnlocalizedHListNode(element=self.HELLO, children=None)],
             list(_parse_hlist_node(['hello'], 'en-US', 'some-id', SUPPORTED_MARKUP['md'])),
         )
 
         self.assertEqual(
-            [SeanoUnlocalizedHListNode(element=SeanoMarkdown('hello', localization='en-US', tags=['some-id']), children=[
-                SeanoUnlocalizedHListNode(element=SeanoMarkdown('world', localization='en-US', tags=['some-id']), children=None),
+            [SeanoUnlocalizedHListNode(element=self.HELLO, children=[
+                SeanoUnlocalizedHListNode(element=self.WORLD, children=None),
             ])],
             list(_parse_hlist_node([{'hello': 'world'}], 'en-US', 'some-id', SUPPORTED_MARKUP['md'])),
         )
 
         self.assertEqual(
-            [SeanoUnlocalizedHListNode(element=SeanoMarkdown('hello', localization='en-US', tags=['some-id']), children=[
-                SeanoUnlocalizedHListNode(element=SeanoMarkdown('world', localization='en-US', tags=['some-id']), children=[
-                    SeanoUnlocalizedHListNode(element=SeanoMarkdown('again', localization='en-US', tags=['some-id']), children=None),
+            [SeanoUnlocalizedHListNode(element=self.HELLO, children=[
+                SeanoUnlocalizedHListNode(element=self.WORLD, children=[
+                    SeanoUnlocalizedHListNode(element=self.AGAIN, children=None),
                 ]),
             ])],
             list(_parse_hlist_node([{'hello': {'world': 'again'}}], 'en-US', 'some-id', SUPPORTED_MARKUP['md'])),
@@ -118,15 +139,15 @@ class HlistParsingTests(unittest.TestCase):
 
         self.assertEqual(
             [
-                SeanoUnlocalizedHListNode(element=SeanoMarkdown('hello', localization='en-US', tags=['some-id']), children=[
-                    SeanoUnlocalizedHListNode(element=SeanoMarkdown('world', localization='en-US', tags=['some-id']), children=[
-                        SeanoUnlocalizedHListNode(element=SeanoMarkdown('again', localization='en-US', tags=['some-id']), children=None),
+                SeanoUnlocalizedHListNode(element=self.HELLO, children=[
+                    SeanoUnlocalizedHListNode(element=self.WORLD, children=[
+                        SeanoUnlocalizedHListNode(element=self.AGAIN, children=None),
                     ]),
                 ]),
-                SeanoUnlocalizedHListNode(element=SeanoMarkdown('goodbye', localization='en-US', tags=['some-id']), children=[
-                    SeanoUnlocalizedHListNode(element=SeanoMarkdown('moon', localization='en-US', tags=['some-id']), children=None),
+                SeanoUnlocalizedHListNode(element=self.GOODBYE, children=[
+                    SeanoUnlocalizedHListNode(element=self.MOON, children=None),
                 ]),
-                SeanoUnlocalizedHListNode(element=SeanoMarkdown('cat', localization='en-US', tags=['some-id']), children=None),
+                SeanoUnlocalizedHListNode(element=self.CAT, children=None),
             ],
             list(_parse_hlist_node([{'hello': {'world': 'again'}}, {'goodbye': 'moon'}, 'cat'], 'en-US', 'some-id', SUPPORTED_MARKUP['md'])),
         )
@@ -0,0 +1,75 @@
+import re
+import unittest
+from unittest import mock
+
+import docutils.writers.html4css1
+
+from shared.rst import *
+from shared.rst import _plain_text_pattern, _plain_text_probe, _rst_cache, _RST_CACHE_MAX_SIZE, \
+    _seano_compile_rst_to_some_html
+
+
+# Inputs near the edge of what the plain text fast path accepts; each must compile the same with or without it:
+_PLAIN_TEXT_SAMPLES = (
+    'Fix typo',
+    'Fixed a crash when opening files (again).',
+    'Support macOS 10.15, 11 and 12',
+    'Hello world!',
+    'Why?',
+    'A.B',
+    'Rev 2) new',
+    '1/2 of the time',
+    'a - b',
+    'A -- B',
+    "it's",
+    '100% done',
+    'www.example.com',
+    # Enumerated list look-alikes:
+    'I. am',
+    'x. y',
+    'X) y',
+    'Z.',
+    'e.g. this',
+)
+
+
+class SeanoRstToHtmlTests(unittest.TestCase):
+
+    def testMermaidOutputIsNeverCached(self):
+        txt = '.. mermaid::\n\n   graph TD\n   A-->B\n'
+        ids = [re.findall(r'id="(mermaid-\d+)"', seano_rst_to_html(txt).html) for _ in range(2)]
+        self.assertEqual(1, len(ids[0]))
+        self.assertEqual(1, len(ids[1]))
+        self.assertNotEqual(ids[0], ids[1])
+
+    def testCacheIsBounded(self):
+        for i in range(_RST_CACHE_MAX_SIZE + 10):
+            seano_rst_to_html('Note number %d' % (i,))
+        self.assertEqual(_RST_CACHE_MAX_SIZE, len(_rst_cache))
+
+    def testCachedResultsAreFreshObjects(self):
+        a = seano_rst_to_html('Fix *typo*')
+        b = seano_rst_to_html('Fix *typo*')
+        self.assertIsNot(a, b)
+        self.assertEqual(a.html, b.html)
+
+    def testPlainTextFastPathMatchesDocUtils(self):
+        args = (docutils.writers.html4css1.Writer, SeanoSingleFileHtmlTranslator)
+        for txt in _PLAIN_TEXT_SAMPLES:
+            with self.subTest(txt=txt):
+                expected = _seano_compile_rst_to_some_html(txt, *args)
+                with mock.patch('shared.rst._plain_text_pattern', re.compile(r'(?!)')):
+                    self.assertEqual(expected, _seano_compile_rst_to_some_html(txt, *args))
+
+    def testPlainTextFastPathIsUsedForPlainText(self):
+        for txt in ('Fix typo', "it's", '100% done', 'A -- B', 'www.example.com'):
+            self.assertTrue(_plain_text_pattern.match(txt), txt)
+        for txt in ('I. am', 'x. y', 'X) y', 'Z.'):
+            self.assertFalse(_plain_text_pattern.match(txt), txt)
+
+    def testPlainTextProbeIsAlwaysCompiledByDocUtils(self):
+        self.assertIsNone(_plain_text_pattern.match(_plain_text_probe))
+
+
+if __name__ == '__main__':
+    unittest.main()
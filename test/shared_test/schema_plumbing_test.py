@@ -0,0 +1,165 @@
+import json
+import unittest
+
+from shared.metacache import SeanoMetaCache
+from shared.schema_painting import *
+from shared.schema_plumbing import *
+
+
+def _release(name, after=(), backstory=(), notes=(), **kwargs):
+    result = {
+        'name': name,
+        'after': [{'name': x} for x in after] + [{'name': x, 'is-backstory': True} for x in backstory],
+        'notes': list(notes),
+    }
+    result.update(kwargs)
+    return result
+
+
+def _cmc(*releases):
+    for r in releases:
+        r['before'] = [{'name': x['name']} for x in releases if r['name'] in [y['name'] for y in x['after']]]
+    return SeanoMetaCache(json.dumps({'releases': list(releases)}))
+
+
+def _sample_dag():
+    #   e
+    #  / \
+    # c   d
+    # |   |\
+    # |   b g (backstory)
+    # |  / \|
+    # | /   h
+    # |/
+    # a
+    #
+    # (d -> a is also a backstory link)
+    return _cmc(
+        _release('e', after=['c', 'd']),
+        _release('d', after=['b'], backstory=['a', 'g'], notes=[
+            {'min-supported-os': '11'},
+            {'min-supported-os': '9', 'is-copied-from-backstory': True},
+        ]),
+        _release('c', after=['a'], notes=[{'min-supported-os': '11'}]),
+        _release('g', after=['h']),
+        _release('b', after=['a', 'h']),
+        _release('h'),
+        _release('a', notes=[{'min-supported-os': '10'}, {'min-supported-os': '10', 'max-supported-os': '14'}]),
+    )
+
+
+class SeanoReleaseAncestryTests(unittest.TestCase):
+
+    def testClosures(self):
+        cmc = _sample_dag()
+        self.assertEqual({'a', 'b', 'c', 'd', 'e', 'g', 'h'}, seano_release_ancestor_names_including_self('e', cmc))
+        self.assertEqual({'b', 'a', 'h'}, seano_release_ancestor_names_including_self('b', cmc))
+        self.assertEqual({'h', 'b', 'g', 'd', 'e'}, seano_release_descendant_names_including_self('h', cmc))
+        self.assertEqual({'e'}, seano_release_descendant_names_including_self('e', cmc))
+
+    def testMinimumLists(self):
+        cmc = _sample_dag()
+        self.assertEqual(['a'], seano_minimum_ancestor_list(['e', 'b', 'a'], cmc))
+        self.assertEqual(['a', 'h'], seano_minimum_ancestor_list(['a', 'h', 'd'], cmc))
+        self.assertEqual(['e'], seano_minimum_descendant_list(['e', 'b', 'a', 'c'], cmc))
+        self.assertEqual(['b', 'c'], seano_minimum_descendant_list(['b', 'c'], cmc))
+        self.assertEqual(['c', 'd'], seano_minimum_descendant_list(iter(['a', 'c', 'd', 'h']), cmc))
+
+    def testTwoCycleNamesOnlyTheCycle(self):
+        cmc = _cmc(
+            _release('c', after=['b']),
+            _release('b', after=['a']),
+            _release('a', after=['b']),
+        )
+        with self.assertRaises(SeanoSchemaPaintingException) as ctx:
+            seano_propagate_sticky_release_fields(cmc, ['min-supported-os'])
+        self.assertEqual('Release ancestry contains a cycle involving these releases: b, a', ctx.exception.args[0])
+
+    def testSelfLoop(self):
+        cmc = _cmc(_release('b', after=['a']), _release('a', after=['a']))
+        with self.assertRaises(SeanoSchemaPaintingException) as ctx:
+            seano_propagate_sticky_release_fields(cmc, ['min-supported-os'])
+        self.assertEqual('Release ancestry contains a cycle involving these releases: a', ctx.exception.args[0])
+        with self.assertRaises(SeanoSchemaPaintingException) as ctx:
+            seano_release_ancestor_names_including_self('b', cmc)
+        self.assertEqual('Release ancestry contains a cycle: a is reachable from itself', ctx.exception.args[0])
+
+
+class SeanoSchemaPaintingTests(unittest.TestCase):
+
+    def testPaintBackstoryReleases(self):
+        cmc = _sample_dag()
+        seano_paint_backstory_releases(cmc, 'e')
+        # a is reached both as a backstory (via d) and not (via c); the non-backstory path wins.
+        # h is reached both via a backstory (g) and not (via b); likewise:
+        self.assertEqual({
+            'a': False,
+            'b': False,
+            'c': False,
+            'd': False,
+            'e': False,
+            'g': True,
+            'h': False,
+        }, {r['name']: r['is-backstory'] for r in cmc.releases})
+
+    def testPaintSysLimits(self):
+        cmc = _sample_dag()
+        seano_paint_release_sys_limits(cmc)
+        self.assertEqual({
+            'a': ('10', '14'),
+            'b': ('10', '14'),
+            'c': ('11', '14'),
+            'd': ('11', '14'),
+            'e': ('11', '14'),
+            'g': (None, None),
+            'h': (None, None),
+        }, {r['name']: (r.get('min-supported-os'), r.get('max-supported-os')) for r in cmc.releases})
+
+    def testPaintSysLimitsConflict(self):
+        cmc = _cmc(
+            _release('c', after=['a', 'b']),
+            _release('b', notes=[{'min-supported-os': '11'}]),
+            _release('a', notes=[{'min-supported-os': '10'}]),
+        )
+        with self.assertRaises(SeanoSchemaPaintingException) as ctx:
+            seano_paint_release_sys_limits(cmc)
+        self.assertEqual([
+            "Unable to merge values: ['10', '11']",
+            '',
+            'This happened because multiple ancestors of the c release',
+        ], ctx.exception.args[0].splitlines()[:3])
+
+    def testPaintRiskLevels(self):
+        cmc = _cmc(
+            _release('a', notes=[{'risk': 'low'}, {'risk': 'high'}, {'risk': 'medium'}]),
+            _release('b', notes=[{'risk': 'low'}, {'risk': 'high', 'is-copied-from-backstory': True}]),
+            _release('c', notes=[{'risk': 'bogus'}, {}]),
+            _release('d', notes=[{}]),
+            _release('e', notes=[{'risk': 'low'}], risk='medium'),
+        )
+        seano_paint_release_risk_levels(cmc)
+        self.assertEqual(['high', 'low', '', None, 'medium'], [r['risk'] for r in cmc.releases])
+
+    def testPaintRiskLevelsMalformed(self):
+        cmc = _cmc(
+            _release('a', notes=[{'risk': ['low']}, {'risk': 'low'}]),
+            _release('b', notes=[{'risk': ['high']}]),
+            _release('c', notes=[{'risk': {'level': 'high'}}, {'risk': 'medium'}, {}]),
+            _release('d', notes=[{'risk': 3}]),
+        )
+        seano_paint_release_risk_levels(cmc)
+        self.assertEqual(['low', '', 'medium', ''], [r['risk'] for r in cmc.releases])
+
+    def testCopyNoteFieldsWithCustomMergeTool(self):
+        cmc = _cmc(_release('a', notes=[{'tags': ['x']}, {'tags': ['y', 'x']}], tags=['z']))
+        def union(*, does_privileged_base_exist, privileged_base, additions):
+            result = set(privileged_base if does_privileged_base_exist else [])
+            for x in additions:
+                result.update(x)
+            return sorted(result)
+        seano_copy_note_fields_to_releases(cmc, {'tags': union})
+        self.assertEqual(['x', 'y', 'z'], cmc.releases[0]['tags'])
+
+
+if __name__ == '__main__':
+    unittest.main()